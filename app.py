@@ -5,7 +5,7 @@ from workflow import LLMWorkflow
 from langchain_core.messages import HumanMessage
 import uuid
 from llm_utils import get_trimmer
-from streamlit_utils import initialise_session_state, disable_chat_input
+from streamlit_utils import initialise_session_state, disable_chat_input, save_chat_history, set_thread_id
 import logging
 
 # Setup logging
@@ -44,7 +44,7 @@ with st.sidebar:
         st.session_state.messages = []
         logger.info("Cleared chat history.")
         
-        st.session_state.thread_id = uuid.uuid4()
+        set_thread_id(str(uuid.uuid4()))
         logger.info("Thread ID has been reset.")
         
         st.rerun()
@@ -134,4 +134,5 @@ if prompt := st.chat_input(
             st.error(error_message)
     finally:
         st.session_state.is_generating = False
+        save_chat_history()
         st.rerun()
\ No newline at end of file
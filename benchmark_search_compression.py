@@ -0,0 +1,147 @@
+import argparse
+import json
+import statistics
+import time
+import uuid
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+from search_compression import compress_search_results, estimate_tokens
+import logging
+
+# Setup logging
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s - %(levelname)s - [%(filename)s:%(lineno)d - %(funcName)s()] - %(message)s"
+)
+logger = logging.getLogger(__name__)
+
+
+def load_payloads(path: str):
+    """
+    Loads recorded search payloads from a JSONL file written with `SEARCH_PAYLOAD_LOG`
+    (one `{"query": ..., "payload": ...}` record per line).
+    """
+    records = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                records.append(json.loads(line))
+    logger.info(f"Loaded {len(records)} recorded search payloads from {path}.")
+    return records
+
+
+def _payload_to_str(payload):
+    return payload if isinstance(payload, str) else json.dumps(payload, ensure_ascii=False)
+
+
+def _time_llm_call(llm, query: str, content: str):
+    """
+    Invokes the LLM with the web search prompt as the final node would,
+    and returns the wall time and prompt token count reported by Ollama.
+    """
+    from llm_utils import prompt_template_for_web_search_tool
+
+    tool_call_id = f"call_{uuid.uuid4().hex}"
+    messages = [
+        HumanMessage(query),
+        AIMessage(content="", tool_calls=[{
+            "name": "tavily_search", "args": {"query": query}, "id": tool_call_id, "type": "tool_call"
+        }]),
+        ToolMessage(content=content, tool_call_id=tool_call_id)
+    ]
+    prompt = prompt_template_for_web_search_tool.invoke({"messages": messages})
+    start = time.perf_counter()
+    response = llm.invoke(prompt)
+    elapsed = time.perf_counter() - start
+    return elapsed, response.response_metadata.get("prompt_eval_count")
+
+
+def _time_llm_calls(llm, query: str, raw: str, compressed: str, repeats: int):
+    """
+    Times the raw and compressed prompts `repeats` times each, alternating which
+    goes first so Ollama's prompt-prefix cache does not favour one of them, and
+    returns the median latency and prompt token count of each.
+    """
+    timings = {"raw": [], "compressed": []}
+    prompt_eval_counts = {}
+    for repeat in range(repeats):
+        order = [("raw", raw), ("compressed", compressed)]
+        if repeat % 2:
+            order.reverse()
+        for name, content in order:
+            elapsed, prompt_eval_count = _time_llm_call(llm, query, content)
+            timings[name].append(elapsed)
+            prompt_eval_counts[name] = prompt_eval_count
+    return (
+        statistics.median(timings["raw"]), prompt_eval_counts["raw"],
+        statistics.median(timings["compressed"]), prompt_eval_counts["compressed"]
+    )
+
+
+def run_benchmark(records, token_budget: int, llm=None, repeats: int = 4):
+    """
+    Compares prompt tokens (and median LLM latency, if a model is given) with and
+    without search result compression on recorded payloads.
+    """
+    token_counter = llm.get_num_tokens if llm is not None else estimate_tokens
+    if llm is not None and records:
+        # Warm-up so model loading is not charged to the first measured call
+        logger.info("Warming up model...")
+        _time_llm_call(llm, records[0].get("query", ""), "warm-up")
+
+    rows = []
+    for record in records:
+        raw = _payload_to_str(record["payload"])
+        query = record.get("query", "")
+
+        start = time.perf_counter()
+        compressed = compress_search_results(raw, query, token_budget)
+        compress_ms = (time.perf_counter() - start) * 1000
+
+        row = {
+            "query": query,
+            "raw_tokens": token_counter(raw),
+            "compressed_tokens": token_counter(compressed),
+            "compress_ms": round(compress_ms, 2)
+        }
+        if llm is not None:
+            (
+                row["raw_latency_s"], row["raw_prompt_eval_count"],
+                row["compressed_latency_s"], row["compressed_prompt_eval_count"]
+            ) = _time_llm_calls(llm, query, raw, compressed, repeats)
+        rows.append(row)
+        logger.info(f"Benchmark row: {row}")
+
+    raw_total = sum(row["raw_tokens"] for row in rows)
+    compressed_total = sum(row["compressed_tokens"] for row in rows)
+    summary = {
+        "payloads": len(rows),
+        "raw_tokens": raw_total,
+        "compressed_tokens": compressed_total,
+        "token_reduction": 1 - compressed_total / raw_total if raw_total else 0.0,
+        "median_compress_ms": statistics.median(row["compress_ms"] for row in rows) if rows else 0.0
+    }
+    if llm is not None and rows:
+        summary["median_raw_latency_s"] = statistics.median(row["raw_latency_s"] for row in rows)
+        summary["median_compressed_latency_s"] = statistics.median(row["compressed_latency_s"] for row in rows)
+    return rows, summary
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark search result compression on recorded payloads.")
+    parser.add_argument("payloads", help="JSONL file of recorded search payloads (SEARCH_PAYLOAD_LOG).")
+    parser.add_argument("--token-budget", type=int, default=1200)
+    parser.add_argument("--repeats", type=int, default=4, help="Timed LLM calls per prompt, order alternated.")
+    parser.add_argument(
+        "--model",
+        default=None,
+        help="Ollama model to time the final LLM call with, e.g. qwen2.5:3b-instruct. Token estimates only if omitted."
+    )
+    args = parser.parse_args()
+
+    llm = None
+    if args.model:
+        from langchain_ollama import ChatOllama
+        llm = ChatOllama(model=args.model, temperature=0)
+
+    _, summary = run_benchmark(load_payloads(args.payloads), args.token_budget, llm, args.repeats)
+    print(json.dumps(summary, indent=2))
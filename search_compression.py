@@ -0,0 +1,247 @@
+import json
+import re
+import numpy as np
+import logging
+
+# Setup logging
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s - %(levelname)s - [%(filename)s:%(lineno)d - %(funcName)s()] - %(message)s"
+)
+logger = logging.getLogger(__name__)
+
+
+# Sentences matching these are navigation, consent or promo boilerplate, unless they
+# share a term with the query (e.g. "log in" for a login question)
+BOILERPLATE_PATTERN = re.compile(
+    r"\b(cookies?|privacy policy|terms of (use|service)|all rights reserved|subscribe|newsletter|"
+    r"sign (in|up)|log ?in|create an account|advertisement|sponsored|share (on|this)|"
+    r"click here|read more|skip to (main )?content|follow us|download (the|our) app|"
+    r"accept all|enable javascript|copyright \d{4})\b|©",
+    re.I
+)
+MARKDOWN_IMAGE_PATTERN = re.compile(r"!\[[^\]]*\]\([^)]*\)")
+MARKDOWN_LINK_PATTERN = re.compile(r"\[([^\]]*)\]\([^)]*\)")
+URL_PATTERN = re.compile(r"https?://\S+")
+SENTENCE_SPLIT_PATTERN = re.compile(r"(?<=[.!?])\s+|\n+")
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+STOPWORDS = frozenset(
+    "a an and are as at be by can did do does for from has have how i if in is it its my of on or "
+    "that the this to was were what when where which who why will with you your".split()
+)
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Cheap token estimate (~4 characters per token), used when no model
+    tokenizer is passed in.
+    """
+    return max(1, len(text) // 4) if text else 0
+
+
+def _stem(token: str) -> str:
+    # Light plural stemming so "lasts" matches "last"
+    if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+        return token[:-1]
+    return token
+
+
+def _tokenize(text: str):
+    return [_stem(token) for token in TOKEN_PATTERN.findall(text.lower()) if token not in STOPWORDS]
+
+
+def _normalize_url(url: str) -> str:
+    url = re.sub(r"^https?://(www\.)?", "", url.strip().lower())
+    return url.split("#")[0].rstrip("/")
+
+
+def _clean_text(text: str) -> str:
+    text = MARKDOWN_IMAGE_PATTERN.sub(" ", text)
+    text = MARKDOWN_LINK_PATTERN.sub(r"\1", text)
+    text = URL_PATTERN.sub(" ", text)
+    lines = []
+    for line in text.splitlines():
+        line = re.sub(r"[#*_|>`]+", " ", line)
+        line = re.sub(r"\s+", " ", line).strip()
+        if line:
+            lines.append(line)
+    return "\n".join(lines)
+
+
+def _split_sentences(text: str, query_terms: set):
+    """
+    Splits cleaned text into candidate sentences. Boilerplate is dropped unless the
+    rest of the sentence mentions a query term, and short fragments are dropped
+    unless they mention a query term, so short factual snippets such as
+    "Released Oct 7." survive.
+    """
+    sentences = []
+    for sentence in SENTENCE_SPLIT_PATTERN.split(text):
+        sentence = sentence.strip()
+        if not sentence:
+            continue
+        if BOILERPLATE_PATTERN.search(sentence):
+            keep = bool(query_terms.intersection(_tokenize(BOILERPLATE_PATTERN.sub(" ", sentence))))
+        elif len(sentence.split()) < 4:
+            keep = bool(query_terms.intersection(_tokenize(sentence)))
+        else:
+            keep = True
+        if keep:
+            sentences.append(sentence)
+    return sentences
+
+
+def bm25_scores(query: str, sentences, k1: float = 1.5, b: float = 0.75) -> np.ndarray:
+    """
+    Scores sentences against the query with BM25, treating each sentence as a
+    document. Only query terms contribute to the score, so the term-frequency
+    matrix is (n_sentences x n_query_terms) and scored in one vectorized pass.
+
+    Returns:
+        np.ndarray: One score per sentence.
+    """
+    query_terms = list(dict.fromkeys(_tokenize(query)))
+    if not sentences or not query_terms:
+        return np.zeros(len(sentences))
+
+    term_index = {term: i for i, term in enumerate(query_terms)}
+    tf = np.zeros((len(sentences), len(query_terms)))
+    lengths = np.zeros(len(sentences))
+    for row, sentence in enumerate(sentences):
+        tokens = _tokenize(sentence)
+        lengths[row] = len(tokens)
+        for token in tokens:
+            column = term_index.get(token)
+            if column is not None:
+                tf[row, column] += 1
+
+    n_docs = len(sentences)
+    df = np.count_nonzero(tf, axis=0)
+    idf = np.log1p((n_docs - df + 0.5) / (df + 0.5))
+    avg_length = max(lengths.mean(), 1.0)
+    norm = k1 * (1 - b + b * lengths / avg_length)
+    return ((tf * (k1 + 1)) / (tf + norm[:, None])) @ idf
+
+
+def has_search_results(content) -> bool:
+    """
+    Whether a search tool output is a JSON payload with a non-empty `results` list, 
+    i.e. worth caching. Error payloads returned as normal content are not.
+    """
+    try:
+        data = json.loads(content) if isinstance(content, str) else content
+    except json.JSONDecodeError:
+        return False
+    return isinstance(data, dict) and isinstance(data.get("results"), list) and len(data["results"]) > 0
+
+
+def compress_search_results(
+    payload,
+    query: str = None,
+    token_budget: int = 1200,
+    max_sentences_per_result: int = 6,
+    token_counter=estimate_tokens
+):
+    """
+    Compresses a web search tool payload before it is fed to the final LLM call.
+
+    Duplicate results (same URL or same content) are dropped, boilerplate is
+    stripped, and the sentences most relevant to the query (BM25) are kept
+    until the token budget is reached. Every result with content keeps its title,
+    URL and best sentence for citations, even if that exceeds the budget, and
+    its sentences stay in their original order. Results with no content are
+    dropped, and Tavily's `answer` is kept.
+
+    Args:
+        payload (str | dict): The raw tool output, e.g. from `TavilySearch`.
+        query (str): The search query. Defaults to the payload's `query`.
+        token_budget (int): Approximate token budget for the compressed output, 
+            beyond the title, URL and best sentence every result keeps.
+        max_sentences_per_result (int): Cap on sentences kept from one result.
+        token_counter (callable): Function returning the token count of a string.
+
+    Returns:
+        str: The compressed payload as JSON, or the original payload unchanged
+        if it cannot be parsed as search results.
+    """
+    data = payload
+    if isinstance(payload, str):
+        try:
+            data = json.loads(payload)
+        except json.JSONDecodeError:
+            return payload
+    if not isinstance(data, dict) or not isinstance(data.get("results"), list):
+        return payload if isinstance(payload, str) else json.dumps(payload, ensure_ascii=False)
+
+    query = query or data.get("query", "")
+    query_terms = set(_tokenize(query))
+    answer = data.get("answer")
+
+    # Dedupe results and split cleaned content into candidate sentences
+    results, seen_urls, seen_contents = [], set(), set()
+    sentences, owners = [], []
+    for result in data["results"]:
+        url = result.get("url", "")
+        text = _clean_text(result.get("raw_content") or result.get("content") or "")
+        content_key = re.sub(r"\W+", "", text.lower())[:500]
+        if (url and _normalize_url(url) in seen_urls) or (content_key and content_key in seen_contents):
+            continue
+        seen_urls.add(_normalize_url(url))
+        seen_contents.add(content_key)
+
+        result_sentences = list(dict.fromkeys(_split_sentences(text, query_terms)))
+        results.append({"title": result.get("title", ""), "url": url})
+        sentences.extend(result_sentences)
+        owners.extend([len(results) - 1] * len(result_sentences))
+
+    # Title, URL and answer are always kept, so they are paid for up front
+    used_tokens = sum(token_counter(r["title"]) + token_counter(r["url"]) for r in results)
+    used_tokens += token_counter(answer) if answer else 0
+    selected = [[] for _ in results]
+
+    if sentences:
+        scores = bm25_scores(query, sentences)
+        # Break ties by position so earlier (usually lead) sentences win
+        order = np.lexsort((np.arange(len(sentences)), -scores))
+
+        # Every result keeps its best sentence, even over budget, so no citation is lost
+        for i in order:
+            owner = owners[i]
+            if not selected[owner]:
+                selected[owner].append(i)
+                used_tokens += token_counter(sentences[i])
+
+        for i in order:
+            owner = owners[i]
+            if i in selected[owner] or len(selected[owner]) >= max_sentences_per_result:
+                continue
+            # Irrelevant sentences are only kept as the best sentence of a result
+            if scores[i] <= 0:
+                continue
+            cost = token_counter(sentences[i])
+            if used_tokens + cost > token_budget:
+                continue
+            selected[owner].append(i)
+            used_tokens += cost
+
+    compressed = {"query": query}
+    if answer:
+        compressed["answer"] = answer
+    compressed["results"] = [
+        {**result, "content": " ".join(sentences[i] for i in sorted(selected[n]))}
+        for n, result in enumerate(results)
+        if selected[n]
+    ]
+    return json.dumps(compressed, ensure_ascii=False)
+
+
+def record_search_payload(path: str, query: str, payload):
+    """
+    Appends a raw search payload to a JSONL file so compression can be
+    benchmarked later on real searches.
+    """
+    try:
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(json.dumps({"query": query, "payload": payload}, ensure_ascii=False) + "\n")
+    except OSError as e:
+        logger.warning(f"Failed to record search payload: {str(e)}")
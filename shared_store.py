@@ -0,0 +1,195 @@
+from langgraph.checkpoint.sqlite import SqliteSaver
+from contextlib import contextmanager
+import hashlib
+import hmac
+import sqlite3
+import json
+import time
+import logging
+
+# Setup logging
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s - %(levelname)s - [%(filename)s:%(lineno)d - %(funcName)s()] - %(message)s"
+)
+logger = logging.getLogger(__name__)
+
+
+def connect(db_path: str) -> sqlite3.Connection:
+    """
+    Opens a connection to the shared SQLite store, in WAL mode with a busy
+    timeout so several worker processes on one host can read and write it.
+    """
+    conn = sqlite3.connect(db_path, timeout=30, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA busy_timeout=30000")
+    return conn
+
+
+@contextmanager
+def transaction(db_path: str):
+    """
+    Opens a short-lived connection to the shared store, commits on success
+    and always closes the connection.
+    """
+    conn = connect(db_path)
+    try:
+        with conn:
+            yield conn
+    finally:
+        conn.close()
+
+
+def get_checkpointer(db_path: str) -> SqliteSaver:
+    """
+    Returns a LangGraph checkpointer backed by the shared SQLite store, so any
+    worker process can resume any `thread_id`.
+    """
+    checkpointer = SqliteSaver(connect(db_path))
+    checkpointer.setup()
+    logger.info(f"Initialized SQLite checkpointer at {db_path}.")
+    return checkpointer
+
+
+class SearchCache:
+    """
+    Web search result cache shared by all worker processes through SQLite.
+
+    Args:
+        db_path (str): Path to the shared SQLite database file.
+        ttl_seconds (int): How long a cached search result stays valid.
+
+    Methods:
+        get(query): Returns the cached tool output for the query, or None.
+        set(query, content): Caches the tool output for the query, deleting expired entries.
+    """
+    def __init__(self, db_path: str, ttl_seconds: int = 3600):
+        self.db_path = db_path
+        self.ttl_seconds = ttl_seconds
+        with transaction(self.db_path) as conn:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS search_cache (
+                    query TEXT PRIMARY KEY,
+                    content TEXT NOT NULL,
+                    created_at REAL NOT NULL
+                )
+                """
+            )
+
+    @staticmethod
+    def _normalize(query: str) -> str:
+        return " ".join(query.lower().split())
+
+    def get(self, query: str):
+        with transaction(self.db_path) as conn:
+            row = conn.execute(
+                "SELECT content FROM search_cache WHERE query = ? AND created_at >= ?",
+                (self._normalize(query), time.time() - self.ttl_seconds)
+            ).fetchone()
+        return row[0] if row else None
+
+    def set(self, query: str, content: str):
+        now = time.time()
+        with transaction(self.db_path) as conn:
+            # Expired rows would otherwise only be replaced by an identical query
+            conn.execute("DELETE FROM search_cache WHERE created_at < ?", (now - self.ttl_seconds,))
+            conn.execute(
+                "INSERT OR REPLACE INTO search_cache (query, content, created_at) VALUES (?, ?, ?)",
+                (self._normalize(query), content, now)
+            )
+
+
+class SessionStore:
+    """
+    Session metadata and UI chat history shared by all worker processes through
+    SQLite, so a session routed to another worker can be restored by `thread_id`.
+
+    Sessions not updated for `max_age_seconds` are deleted, together with their
+    LangGraph checkpoints, each time a store is created (once per worker process).
+
+    Args:
+        db_path (str): Path to the shared SQLite database file.
+        max_age_seconds (int): How long an idle session is kept. Defaults to 30 days.
+
+    Methods:
+        load_messages(thread_id): Returns the saved chat history, or an empty list.
+        save_messages(thread_id, messages): Saves the chat history of a session.
+        delete_expired(): Deletes idle sessions and their checkpoints.
+    """
+    def __init__(self, db_path: str, max_age_seconds: int = 30 * 24 * 3600):
+        self.db_path = db_path
+        self.max_age_seconds = max_age_seconds
+        with transaction(self.db_path) as conn:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS sessions (
+                    thread_id TEXT PRIMARY KEY,
+                    messages TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+                """
+            )
+
+        self.delete_expired()
+
+    def delete_expired(self) -> int:
+        """
+        Deletes sessions not updated for `max_age_seconds`, and their checkpoints
+        if the LangGraph checkpoint tables exist. Returns the number of sessions deleted.
+        """
+        cutoff = time.time() - self.max_age_seconds
+        with transaction(self.db_path) as conn:
+            expired = [row[0] for row in conn.execute(
+                "SELECT thread_id FROM sessions WHERE updated_at < ?", (cutoff,)
+            )]
+            if not expired:
+                return 0
+            tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+            for table in ("checkpoints", "writes"):
+                if table in tables:
+                    conn.executemany(f"DELETE FROM {table} WHERE thread_id = ?", [(t,) for t in expired])
+            conn.executemany("DELETE FROM sessions WHERE thread_id = ?", [(t,) for t in expired])
+        logger.info(f"Deleted {len(expired)} expired sessions.")
+        return len(expired)
+
+    def load_messages(self, thread_id) -> list:
+        with transaction(self.db_path) as conn:
+            row = conn.execute(
+                "SELECT messages FROM sessions WHERE thread_id = ?", (str(thread_id),)
+            ).fetchone()
+        return json.loads(row[0]) if row else []
+
+    def save_messages(self, thread_id, messages: list):
+        now = time.time()
+        with transaction(self.db_path) as conn:
+            conn.execute(
+                """
+                INSERT INTO sessions (thread_id, messages, created_at, updated_at) VALUES (?, ?, ?, ?)
+                ON CONFLICT(thread_id) DO UPDATE SET messages = excluded.messages, updated_at = excluded.updated_at
+                """,
+                (str(thread_id), json.dumps(messages, ensure_ascii=False), now, now)
+            )
+
+
+def sign_thread_id(thread_id: str, secret: str) -> str:
+    """
+    Returns `<thread_id>.<signature>`, an HMAC-signed thread ID that is safe to put
+    in a URL: only this deployment can mint one that `verify_thread_id()` accepts.
+    """
+    signature = hmac.new(secret.encode("utf-8"), str(thread_id).encode("utf-8"), hashlib.sha256).hexdigest()
+    return f"{thread_id}.{signature}"
+
+
+def verify_thread_id(token: str, secret: str):
+    """
+    Returns the thread ID from a token made by `sign_thread_id()`, or None if the
+    token is malformed or its signature does not match.
+    """
+    thread_id, _, signature = (token or "").rpartition(".")
+    if not thread_id or not signature:
+        return None
+    if not hmac.compare_digest(sign_thread_id(thread_id, secret), token):
+        return None
+    return thread_id
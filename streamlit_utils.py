@@ -5,6 +5,8 @@ from workflow import LLMWorkflow
 from langchain_core.messages import HumanMessage
 import uuid
 from llm_utils import get_trimmer
+from shared_store import SessionStore, SearchCache, get_checkpointer, sign_thread_id, verify_thread_id
+import os
 import logging
 
 # Setup logging
@@ -14,6 +16,84 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Path to the SQLite store shared by all worker processes, if running several workers
+SHARED_STORE_PATH = os.getenv("SHARED_STORE_PATH")
+
+# Secret shared by all workers to sign thread IDs kept in the URL
+THREAD_ID_SECRET = os.getenv("THREAD_ID_SECRET")
+
+
+@st.cache_resource
+def get_session_store():
+    """
+    Returns the process-wide session store, or None if no shared store is configured. 
+    Warns once per process if the store is configured without THREAD_ID_SECRET.
+    """
+    if not SHARED_STORE_PATH:
+        return None
+    if not THREAD_ID_SECRET:
+        logger.warning(
+            "SHARED_STORE_PATH is set without THREAD_ID_SECRET: thread IDs are not kept in the URL, "
+            "so conversations will not continue when another worker serves a session."
+        )
+    logger.info(f"Initialized session store at {SHARED_STORE_PATH}.")
+    return SessionStore(SHARED_STORE_PATH)
+
+
+@st.cache_resource
+def get_shared_checkpointer():
+    """
+    Returns the process-wide SQLite checkpointer, or None if no shared store is configured. 
+    One connection per process is shared by every session's workflow.
+    """
+    if not SHARED_STORE_PATH:
+        return None
+    return get_checkpointer(SHARED_STORE_PATH)
+
+
+@st.cache_resource
+def get_search_cache():
+    """
+    Returns the process-wide search cache, or None if no shared store is configured
+    """
+    if not SHARED_STORE_PATH:
+        return None
+    logger.info(f"Initialized search cache at {SHARED_STORE_PATH}.")
+    return SearchCache(SHARED_STORE_PATH)
+
+
+def set_thread_id(thread_id: str):
+    """
+    Set the session thread ID, and keep it in the URL (signed) if a secret is configured
+    """
+    st.session_state.thread_id = thread_id
+    if THREAD_ID_SECRET:
+        st.query_params["thread_id"] = sign_thread_id(thread_id, THREAD_ID_SECRET)
+
+
+def get_thread_id_from_url():
+    """
+    Returns the thread ID from the URL if its signature is valid, otherwise None. 
+    Without a secret, thread IDs from the URL are never trusted.
+    """
+    token = st.query_params.get("thread_id")
+    if not token or not THREAD_ID_SECRET:
+        return None
+    thread_id = verify_thread_id(token, THREAD_ID_SECRET)
+    if thread_id is None:
+        logger.warning("Ignored thread ID with an invalid signature from the URL.")
+    return thread_id
+
+
+def save_chat_history():
+    """
+    Save chat history to the shared session store, if configured
+    """
+    session_store = get_session_store()
+    if session_store is not None:
+        session_store.save_messages(st.session_state.thread_id, st.session_state.messages)
+
+
 def initialise_session_state():
     """
     Initialise session state variables from streamlit
@@ -35,19 +115,25 @@ def initialise_session_state():
 
     # Initialize model
     if "workflow" not in st.session_state:
-        st.session_state.workflow = LLMWorkflow(model, trimmer).get_workflow()
+        st.session_state.workflow = LLMWorkflow(
+            model, 
+            trimmer, 
+            checkpointer=get_shared_checkpointer(), 
+            search_cache=get_search_cache()
+        ).get_workflow()
         logger.info("Initialized workflow.")
     workflow = st.session_state.workflow
 
-    # Initialize thread_id
+    # Initialize thread_id, kept signed in the URL so any worker process can resume the thread
     if "thread_id" not in st.session_state:
-        st.session_state.thread_id = uuid.uuid4()
+        set_thread_id(get_thread_id_from_url() or str(uuid.uuid4()))
         logger.info("Initialized thread ID.")
     thread_id = st.session_state.thread_id
 
-    # Initialize chat history
+    # Initialize chat history, restored from the shared session store if available
     if "messages" not in st.session_state:
-        st.session_state.messages = []
+        session_store = get_session_store()
+        st.session_state.messages = session_store.load_messages(thread_id) if session_store else []
         logger.info("Initialized chat history.")
 
     # Initialize the input control flag
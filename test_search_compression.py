@@ -0,0 +1,155 @@
+import json
+from pathlib import Path
+import numpy as np
+import pytest
+from search_compression import bm25_scores, compress_search_results, estimate_tokens, has_search_results
+
+
+def _payload(results, query="", **extra):
+    return json.dumps({"query": query, "results": results, **extra})
+
+
+def test_bm25_ranks_matching_sentences_first():
+    sentences = [
+        "Cats sleep for most of the day.",
+        "The Perseverance rover landed on Mars in 2021.",
+        "Mars is the fourth planet from the Sun.",
+    ]
+    scores = bm25_scores("when did perseverance land on mars", sentences)
+    assert scores.shape == (3,)
+    assert scores[0] == 0
+    assert np.argmax(scores) == 1
+    assert scores[2] > 0
+
+
+def test_bm25_without_query_terms_scores_zero():
+    assert not bm25_scores("the of and", ["Some sentence here."]).any()
+
+
+def test_non_json_content_passes_through():
+    assert compress_search_results("Error: rate limited", "anything") == "Error: rate limited"
+    assert compress_search_results('{"no_results": true}', "anything") == '{"no_results": true}'
+
+
+def test_dedupes_by_url_and_content():
+    content = "Perseverance landed on Mars on 18 February 2021 in Jezero crater."
+    payload = _payload([
+        {"title": "A", "url": "https://www.example.com/a/", "content": content},
+        {"title": "A again", "url": "https://example.com/a", "content": "Other words about the Mars landing here."},
+        {"title": "B", "url": "https://mirror.example.org/a", "content": content},
+    ], query="perseverance mars landing")
+    results = json.loads(compress_search_results(payload))["results"]
+    assert [r["title"] for r in results] == ["A"]
+
+
+def test_enforces_token_budget_and_keeps_citations():
+    filler = " ".join(f"Mars fact number {i} is about the red planet surface." for i in range(200))
+    payload = _payload([
+        {"title": "Mars facts", "url": "https://example.com/mars", "content": filler},
+        {"title": "More Mars", "url": "https://example.org/mars", "content": filler.replace("fact", "note")},
+    ], query="mars planet facts")
+    compressed = compress_search_results(payload, token_budget=200)
+    assert estimate_tokens(compressed) < estimate_tokens(payload)
+    results = json.loads(compressed)["results"]
+    used = sum(estimate_tokens(r["title"]) + estimate_tokens(r["url"]) + estimate_tokens(r["content"]) for r in results)
+    assert used <= 200 + len(results) * 8  # sentence joins add a few characters
+    assert {r["url"] for r in results} == {"https://example.com/mars", "https://example.org/mars"}
+
+
+def test_boilerplate_with_query_terms_is_kept():
+    payload = _payload([{
+        "title": "Reset your Gmail password",
+        "url": "https://support.google.com/mail/answer/41078",
+        "content": (
+            "If you cannot log in to Gmail, go to the account recovery page to reset your password. "
+            "Sign in with your recovery email to reset the Gmail password. "
+            "Google will send a code to verify it is you. "
+            "Subscribe to our newsletter for weekly tips and tricks."
+        )
+    }], query="how to reset my gmail password if I cannot log in")
+    content = json.loads(compress_search_results(payload))["results"][0]["content"]
+    assert "cannot log in to Gmail" in content
+    assert "Sign in with your recovery email" in content
+    assert "newsletter" not in content
+
+
+def test_copyright_question_keeps_copyright_result():
+    payload = _payload([{
+        "title": "How long does copyright last?",
+        "url": "https://www.copyright.gov/help/faq/",
+        "content": "Copyright generally lasts for the life of the author plus 70 years."
+    }], query="how long does copyright last")
+    results = json.loads(compress_search_results(payload))["results"]
+    assert results[0]["content"] == "Copyright generally lasts for the life of the author plus 70 years."
+
+
+def test_short_relevant_snippet_is_kept_and_answer_carried():
+    payload = _payload([
+        {"title": "iOS 18", "url": "https://example.com/ios", "content": "Released Oct 7."},
+        {"title": "Menu", "url": "https://example.com/menu", "content": "Home\nSign in\nSubscribe"},
+    ], query="when was ios 18 released", answer="iOS 18 was released in September.")
+    compressed = json.loads(compress_search_results(payload))
+    assert compressed["answer"] == "iOS 18 was released in September."
+    assert compressed["results"] == [
+        {"title": "iOS 18", "url": "https://example.com/ios", "content": "Released Oct 7."}
+    ]
+
+
+@pytest.mark.parametrize("payload", [
+    {"query": "q", "results": []},
+    {"query": "q", "results": [{"title": "Empty", "url": "https://example.com", "content": ""}]},
+])
+def test_empty_results_produce_no_citations(payload):
+    assert json.loads(compress_search_results(payload))["results"] == []
+
+
+def test_boilerplate_matching_only_inside_phrase_is_dropped():
+    payload = _payload([{
+        "title": "Copyright term",
+        "url": "https://example.com/copyright",
+        "content": (
+            "In the US, copyright lasts for the life of the author plus 70 years.\n"
+            "Follow us on social media\n"
+            "Copyright 2025 Example Media."
+        )
+    }], query="how long does copyright last in the us")
+    content = json.loads(compress_search_results(payload))["results"][0]["content"]
+    assert content == "In the US, copyright lasts for the life of the author plus 70 years."
+
+
+def test_recorded_payloads_shrink_and_keep_citations():
+    with open(Path(__file__).parent / "test_data" / "search_payloads.jsonl", encoding="utf-8") as f:
+        records = [json.loads(line) for line in f if line.strip()]
+    for record in records:
+        compressed = compress_search_results(record["payload"], record["query"])
+        assert estimate_tokens(compressed) < estimate_tokens(record["payload"])
+        results = json.loads(compressed)["results"]
+        assert results and all(r["title"] and r["url"] and r["content"] for r in results)
+
+
+@pytest.mark.parametrize("content, expected", [
+    ('{"query": "q", "results": [{"title": "A"}]}', True),
+    ('{"query": "q", "results": []}', False),
+    ('{"error": "Invalid API key"}', False),
+    ("Error: rate limited", False),
+    ({"results": [{"title": "A"}]}, True),
+])
+def test_has_search_results(content, expected):
+    assert has_search_results(content) is expected
+
+
+def test_budget_below_citation_cost_keeps_every_result():
+    results = [
+        {
+            "title": f"Mars article {n}",
+            "url": f"https://example{n}.com/mars",
+            "content": f"Mars rover fact {n} is about Jezero crater. Unrelated filler sentence number {n} here. "
+                       f"Another Mars rover detail {n} about the landing."
+        }
+        for n in range(5)
+    ]
+    compressed = json.loads(compress_search_results(_payload(results, query="mars rover"), token_budget=50))
+    assert [r["url"] for r in compressed["results"]] == [r["url"] for r in results]
+    for n, result in enumerate(compressed["results"]):
+        assert result["title"] == f"Mars article {n}"
+        assert result["content"] == f"Mars rover fact {n} is about Jezero crater."
@@ -0,0 +1,239 @@
+import json
+import multiprocessing
+import os
+import time
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage
+from langchain_core.runnables import RunnableLambda
+from langchain_core.tools import tool
+from shared_store import (
+    SearchCache, SessionStore, get_checkpointer, sign_thread_id, transaction, verify_thread_id
+)
+
+# workflow.py builds the real Tavily tool at import time, which needs an API key
+os.environ.setdefault("TAVILY_API_KEY", "test-key")
+
+# Workers are spawned, not forked, so each one starts with a fresh interpreter
+# and shares nothing with the test process except the SQLite file.
+spawn = multiprocessing.get_context("spawn")
+
+SEARCH_CALLS = []
+
+
+def _run_in_worker(target, *args):
+    with spawn.Pool(1) as pool:
+        return pool.apply(target, args)
+
+
+@tool("tavily_search")
+def stub_search(query: str) -> dict:
+    """Stub of the Tavily search tool that records its calls."""
+    SEARCH_CALLS.append(query)
+    return {
+        "query": query,
+        "answer": None,
+        "results": [{
+            "title": "AI news",
+            "url": "https://example.com/ai-news",
+            "content": "A new AI model was released today.",
+            "raw_content": (
+                "Skip to content\nSubscribe to our newsletter for weekly updates.\n"
+                "A new AI model was released today with better reasoning. "
+                "Cats sleep for most of the day and enjoy warm places."
+            )
+        }]
+    }
+
+
+@tool("tavily_search")
+def failing_search(query: str) -> dict:
+    """Stub of the Tavily search tool that always fails."""
+    raise RuntimeError("search API unavailable")
+
+
+class FakeChatModel:
+    """
+    Minimal stand-in for ChatOllama: answers with the worker name and the number
+    of prompt messages it saw, and never asks for a tool.
+    """
+    def __init__(self, name: str):
+        self.name = name
+
+    def bind_tools(self, tools):
+        return self
+
+    def invoke(self, prompt):
+        return AIMessage(f"{self.name} saw {len(prompt.to_messages())} prompt messages")
+
+
+def _build_workflow(worker_name, checkpointer, search_cache, search_tool):
+    import workflow
+    from tool_router import ToolRouter
+
+    workflow.tavily_search_tool = search_tool
+    return workflow.LLMWorkflow(
+        FakeChatModel(worker_name),
+        RunnableLambda(lambda messages: messages),
+        tool_router=ToolRouter(),
+        checkpointer=checkpointer,
+        search_cache=search_cache
+    ).get_workflow()
+
+
+def _chat_turn(db_path, worker_name, thread_id, text, use_web_search=False):
+    """
+    Runs one conversation turn on the app's LLMWorkflow compiled with the shared
+    checkpointer and search cache, as an app worker would, and returns what the
+    thread looks like afterwards.
+    """
+    app = _build_workflow(worker_name, get_checkpointer(db_path), SearchCache(db_path), stub_search)
+    config = {"configurable": {"thread_id": thread_id, "use_web_search": use_web_search}}
+    state = app.invoke({"messages": [HumanMessage(text)]}, config)
+    return {
+        "messages": [(message.type, message.content) for message in state["messages"]],
+        "route_decision": state["route_decision"]["decision"],
+        "search_calls": list(SEARCH_CALLS)
+    }
+
+
+def _save_messages(db_path, thread_id, messages):
+    SessionStore(db_path).save_messages(thread_id, messages)
+
+
+def _load_messages(db_path, thread_id):
+    return SessionStore(db_path).load_messages(thread_id)
+
+
+def _cache_set(db_path, query, content):
+    SearchCache(db_path).set(query, content)
+
+
+def _cache_get(db_path, query, ttl_seconds=3600):
+    return SearchCache(db_path, ttl_seconds=ttl_seconds).get(query)
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / "shared.db")
+
+
+def test_conversation_moves_between_workers(db_path):
+    first = _run_in_worker(_chat_turn, db_path, "worker-1", "thread-1", "hi")
+    assert first["messages"] == [("human", "hi"), ("ai", "worker-1 saw 2 prompt messages")]
+    assert first["route_decision"] == "no_search"
+
+    second = _run_in_worker(_chat_turn, db_path, "worker-2", "thread-1", "still there?")
+    assert second["messages"] == first["messages"] + [
+        ("human", "still there?"), ("ai", "worker-2 saw 4 prompt messages")
+    ]
+
+    other_thread = _run_in_worker(_chat_turn, db_path, "worker-2", "thread-2", "new chat")
+    assert other_thread["messages"] == [("human", "new chat"), ("ai", "worker-2 saw 2 prompt messages")]
+
+
+def test_web_search_turn_moves_between_workers(db_path):
+    query = "What's the latest news on AI"
+    first = _run_in_worker(_chat_turn, db_path, "worker-1", "thread-1", query, True)
+    assert first["route_decision"] == "search"
+    assert first["search_calls"] == [query]
+    assert [message_type for message_type, _ in first["messages"]] == ["human", "ai", "tool", "ai"]
+
+    # The compressed tool message replaced the raw one by ID instead of being appended
+    tool_payload = json.loads(first["messages"][2][1])
+    assert tool_payload["results"] == [{
+        "title": "AI news",
+        "url": "https://example.com/ai-news",
+        "content": "A new AI model was released today with better reasoning."
+    }]
+
+    # Another worker continues the thread and serves the same search from the shared cache
+    second = _run_in_worker(_chat_turn, db_path, "worker-2", "thread-1", query, True)
+    assert second["route_decision"] == "search"
+    assert second["search_calls"] == []
+    assert second["messages"][:4] == first["messages"]
+    assert [message_type for message_type, _ in second["messages"][4:]] == ["human", "ai", "tool", "ai"]
+    assert json.loads(second["messages"][6][1]) == tool_payload
+    assert second["messages"][7] == ("ai", "worker-2 saw 8 prompt messages")
+
+
+def test_concurrent_workers_share_store(db_path):
+    get_checkpointer(db_path)  # create the tables before the workers race
+    with spawn.Pool(3) as pool:
+        results = pool.starmap(
+            _chat_turn, [(db_path, f"worker-{i}", f"thread-{i}", f"hello {i}") for i in range(3)]
+        )
+    assert [result["messages"] for result in results] == [
+        [("human", f"hello {i}"), ("ai", f"worker-{i} saw 2 prompt messages")] for i in range(3)
+    ]
+
+
+def test_failed_search_keeps_error_status(db_path):
+    app = _build_workflow("worker-1", get_checkpointer(db_path), SearchCache(db_path), failing_search)
+    config = {"configurable": {"thread_id": "thread-1", "use_web_search": True}}
+    state = app.invoke({"messages": [HumanMessage("What's the latest news on AI")]}, config)
+
+    tool_message = state["messages"][2]
+    assert tool_message.type == "tool"
+    assert tool_message.status == "error"
+    assert "search API unavailable" in tool_message.content
+    assert SearchCache(db_path).get("What's the latest news on AI") is None
+
+
+def test_session_history_moves_between_workers(db_path):
+    messages = [
+        {"role": "user", "avatar": ":material/taunt:", "content": "hi"},
+        {"role": "assistant", "avatar": ":material/network_intelligence:", "content": "hello 👋"},
+    ]
+    _run_in_worker(_save_messages, db_path, "thread-1", messages)
+    assert _run_in_worker(_load_messages, db_path, "thread-1") == messages
+    assert _run_in_worker(_load_messages, db_path, "unknown-thread") == []
+
+    _run_in_worker(_save_messages, db_path, "thread-1", messages[:1])
+    assert _load_messages(db_path, "thread-1") == messages[:1]
+
+
+def test_search_cache_hit_and_miss_across_workers(db_path):
+    _run_in_worker(_cache_set, db_path, "Latest  AI news", '{"results": [1]}')
+    assert _run_in_worker(_cache_get, db_path, "latest ai news") == '{"results": [1]}'
+    assert _run_in_worker(_cache_get, db_path, "weather in paris") is None
+
+
+def test_search_cache_entries_expire(db_path):
+    _run_in_worker(_cache_set, db_path, "latest ai news", '{"results": [1]}')
+    time.sleep(1.1)
+    assert _run_in_worker(_cache_get, db_path, "latest ai news", 1) is None
+    assert _run_in_worker(_cache_get, db_path, "latest ai news", 3600) == '{"results": [1]}'
+
+
+def test_search_cache_deletes_expired_rows(db_path):
+    SearchCache(db_path, ttl_seconds=1).set("old query", '{"results": [1]}')
+    time.sleep(1.1)
+    SearchCache(db_path, ttl_seconds=1).set("new query", '{"results": [2]}')
+    with transaction(db_path) as conn:
+        assert [row[0] for row in conn.execute("SELECT query FROM search_cache")] == ["new query"]
+
+
+def test_expired_sessions_are_deleted_with_checkpoints(db_path):
+    app = _build_workflow("worker-1", get_checkpointer(db_path), SearchCache(db_path), stub_search)
+    for thread_id in ("old-thread", "new-thread"):
+        app.invoke({"messages": [HumanMessage("hi")]}, {"configurable": {"thread_id": thread_id}})
+        SessionStore(db_path).save_messages(thread_id, [{"role": "user", "content": "hi"}])
+    with transaction(db_path) as conn:
+        conn.execute("UPDATE sessions SET updated_at = 0 WHERE thread_id = 'old-thread'")
+
+    # A worker starting up removes the idle session and its checkpoints
+    assert _run_in_worker(_load_messages, db_path, "old-thread") == []
+    assert _load_messages(db_path, "new-thread") == [{"role": "user", "content": "hi"}]
+    with transaction(db_path) as conn:
+        for table in ("checkpoints", "writes"):
+            thread_ids = {row[0] for row in conn.execute(f"SELECT thread_id FROM {table}")}
+            assert thread_ids == {"new-thread"}
+
+
+def test_signed_thread_ids():
+    token = sign_thread_id("thread-1", "secret")
+    assert verify_thread_id(token, "secret") == "thread-1"
+    assert verify_thread_id(token, "other-secret") is None
+    assert verify_thread_id("thread-1", "secret") is None
+    assert verify_thread_id(token.replace("thread-1", "thread-2"), "secret") is None
+    assert verify_thread_id("", "secret") is None
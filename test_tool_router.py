@@ -0,0 +1,138 @@
+import pytest
+from tool_router import (
+    ToolRouter, HashedLogisticClassifier, evaluate_router, evaluate_decision_log,
+    load_labelled_queries, SEARCH, NO_SEARCH, ASK_LLM, MAX_SEARCH_QUERY_CHARS
+)
+
+
+@pytest.fixture
+def router():
+    return ToolRouter()
+
+
+@pytest.mark.parametrize("query", [
+    "What is the weather in Paris today?",
+    "today's weather in London",
+    "What's the latest news on AI",
+    "Who won the game last night?",
+    "search for cheap flights to Tokyo",
+    "stock price of Tesla",
+])
+def test_strong_signals_search(router, query):
+    assert router.decide(query)[0] == SEARCH
+
+
+@pytest.mark.parametrize("query", [
+    "hi",
+    "Thanks!",
+    "12 * 7",
+    "what is your name?",
+    "write me a poem about cats",
+])
+def test_no_search_rules(router, query):
+    assert router.decide(query)[0] == NO_SEARCH
+
+
+@pytest.mark.parametrize("query", [
+    "Explain binary search in Python",
+    "What does electric current mean?",
+    "I am currently learning Python, explain decorators",
+    "How do I interpret my blood test results?",
+    "score function in statistics",
+    "How do I beat the 2048 game?",
+    "Explain the year 2038 problem",
+    "I was born in 2025, how old am I?",
+    "Who won World War II?",
+    "What is the price of a coffee in the novel?",
+    "What's the weather like on Mars in general?",
+    "Write headlines for my blog post about cats",
+    "Explain how the news feed algorithm works",
+    "write a function that returns today's date",
+    "What is up-to-date mean",
+])
+def test_weak_signals_do_not_search(router, query):
+    assert router.decide(query)[0] == ASK_LLM
+
+
+def test_rewrite_with_freshness_conflict_asks_llm(router):
+    decision, details = router.decide("Summarize the latest news on AI")
+    assert decision == ASK_LLM
+    assert details["source"] == "rule_conflict"
+
+
+def test_follow_up_asks_llm(router):
+    decision, details = router.decide("And what's the latest news on it?")
+    assert decision == ASK_LLM
+    assert details["guard"] == "follow_up"
+
+
+def test_long_message_asks_llm(router):
+    decision, details = router.decide("latest news " + "x" * MAX_SEARCH_QUERY_CHARS)
+    assert decision == ASK_LLM
+    assert details["guard"] == "too_long"
+
+
+@pytest.mark.parametrize("value, expected", [("0.25", 0.25), ("not-a-number", 0.0), ("", 0.0)])
+def test_from_env_parses_shadow_rate(monkeypatch, value, expected):
+    monkeypatch.setenv("TOOL_ROUTER_SHADOW_RATE", value)
+    assert ToolRouter.from_env().shadow_rate == expected
+
+
+def _train_classifier():
+    texts = ["who won the game last night", "stock price of apple", "explain photosynthesis", "write a python loop"]
+    return HashedLogisticClassifier(n_features=2 ** 12).fit(texts * 5, [1, 1, 0, 0] * 5)
+
+
+def test_classifier_learns_and_round_trips(tmp_path):
+    classifier = _train_classifier()
+    assert classifier.predict_proba("who won the game") > 0.5
+    assert classifier.predict_proba("explain photosynthesis") < 0.5
+
+    path = tmp_path / "classifier.npz"
+    classifier.save(str(path))
+    loaded = HashedLogisticClassifier.load(str(path))
+    assert loaded.n_features == classifier.n_features
+    assert loaded.predict_proba("who won the game") == pytest.approx(classifier.predict_proba("who won the game"))
+
+
+def test_classifier_thresholds():
+    router = ToolRouter(classifier=_train_classifier(), search_threshold=0.6, no_search_threshold=0.4)
+    assert router.decide("who won the game")[0] == SEARCH
+    assert router.decide("explain photosynthesis")[0] == NO_SEARCH
+
+
+def test_should_shadow_requires_log_and_rate(tmp_path):
+    assert not ToolRouter(shadow_rate=1.0).should_shadow(SEARCH)
+    router = ToolRouter(decision_log_path=str(tmp_path / "log.jsonl"), shadow_rate=1.0)
+    assert router.should_shadow(SEARCH)
+    assert router.should_shadow(NO_SEARCH)
+    assert not router.should_shadow(ASK_LLM)
+    assert not ToolRouter(decision_log_path=str(tmp_path / "log.jsonl")).should_shadow(SEARCH)
+
+
+def test_evaluate_decision_log_with_shadow_choices(tmp_path):
+    path = tmp_path / "log.jsonl"
+    router = ToolRouter(decision_log_path=str(path), shadow_rate=1.0)
+    for query, searched in [("weather in Paris today", True), ("hi", False), ("latest news", False), ("explain gravity", True)]:
+        decision, details = router.decide(query)
+        decision_id = router.log_decision("t1", query, decision, details)
+        router.log_llm_choice(decision_id, "t1", query, searched)
+
+    report = evaluate_decision_log(str(path))
+    assert report["total"] == 4
+    assert report["deferred"] == 1
+    assert report["coverage"] == pytest.approx(0.75)
+    assert (report["tp"], report["tn"], report["fp"]) == (1, 1, 1)
+    assert report["accuracy"] == pytest.approx(2 / 3)
+
+    queries, labels = load_labelled_queries(str(path))
+    assert queries == ["weather in Paris today", "hi", "latest news", "explain gravity"]
+    assert labels == [True, False, False, True]
+
+
+def test_evaluate_router_on_candidate(router):
+    report = evaluate_router(router, ["weather in Paris today", "hi", "explain gravity"], [True, False, False])
+    assert report == {
+        "total": 3, "coverage": pytest.approx(2 / 3), "accuracy": 1.0,
+        "tp": 1, "fp": 0, "tn": 1, "fn": 0, "deferred": 1
+    }
@@ -0,0 +1,376 @@
+import json
+import os
+import random
+import re
+import time
+import uuid
+import zlib
+import numpy as np
+import logging
+
+# Setup logging
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s - %(levelname)s - [%(filename)s:%(lineno)d - %(funcName)s()] - %(message)s"
+)
+logger = logging.getLogger(__name__)
+
+
+SEARCH = "search"
+NO_SEARCH = "no_search"
+ASK_LLM = "ask_llm"
+
+
+# Keyword/regex rules, checked in order. The first matching rule wins. Search rules
+# skip the LLM and spend Tavily credits, so they only match explicit requests for a
+# search or for current data. Topic words alone ("news", "weather", "2038", "score")
+# are left to the classifier or the LLM.
+TIME_NOW = r"(today|tonight|tomorrow|yesterday|this week|right now|now|currently|at the moment)"
+SEARCH_RULES = [
+    ("current_news", re.compile(r"\b(latest|today'?s|breaking|recent|this week'?s)\s+(news|headlines|updates?)\b|\bnews\s+" + TIME_NOW + r"\b", re.I)),
+    ("live_weather", re.compile(r"\b(weather|forecast)\b.*\b" + TIME_NOW + r"\b|\b(today|tonight|tomorrow)'?s?\s+(weather|forecast)\b", re.I)),
+    ("live_market", re.compile(r"\b(stock|share) price (of|for)\b|\b(current|live|today'?s) (stock price|share price|exchange rate)\b|\b(stock|share) price\s+" + TIME_NOW + r"\b", re.I)),
+    ("live_score", re.compile(r"\bwho (won|is winning)\b.*\b(last night|" + TIME_NOW[1:-1] + r")\b|\b(live|current) scores?\b", re.I)),
+    ("explicit", re.compile(r"\b(search (the web|online|the internet)|web search|google (it|this|that)|look (it|this|that) up|browse the web|find (me )?(some )?(links|sources|articles))\b|^\s*(please )?(search|google) for\b", re.I)),
+]
+
+NO_SEARCH_RULES = [
+    ("smalltalk", re.compile(r"^\s*(hi|hello|hey|yo|thanks?|thank you|ok(ay)?|cool|nice|bye|good (morning|afternoon|evening|night))\b[\s!.?]*$", re.I)),
+    ("about_bot", re.compile(r"\b(who|what) are you\b|\byour name\b", re.I)),
+    ("arithmetic", re.compile(r"^[\d\s+\-*/^().=%x]+\??$", re.I)),
+    ("rewrite", re.compile(r"^\s*(please )?(rewrite|rephrase|translate|summari[sz]e|proofread|paraphrase|fix the grammar)\b", re.I)),
+    ("code", re.compile(r"```|\b(traceback|stack trace)\b", re.I)),
+    ("creative", re.compile(r"^\s*(please )?(write|compose|tell) (me )?(a |an )?(poem|story|joke|haiku|song|limerick)\b", re.I)),
+]
+
+# Messages that refer back to earlier turns need the LLM to write a useful search query
+FOLLOW_UP_PATTERN = re.compile(
+    r"^\s*(and|also|so|but|what about|how about)\b|\b(the (same|other|newest|latest|first|last) one|it|that|this|those|these|they|them)\s*[?.!]*\s*$",
+    re.I
+)
+
+# Longest message the router turns into a search query by itself (Tavily's query limit)
+MAX_SEARCH_QUERY_CHARS = 400
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+
+def _tokenize(text: str):
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+class HashedLogisticClassifier:
+    """
+    A small logistic regression model over hashed unigram and bigram features,
+    used to decide whether a query needs a web search.
+
+    Features are hashed with CRC32 (stable across processes, unlike `hash()`)
+    into a fixed-size weight vector, so scoring a query is a gather and a dot
+    product over a handful of indices.
+
+    Args:
+        n_features (int): Size of the hashed feature space.
+        weights (np.ndarray): Optional pre-trained weight vector.
+        bias (float): Optional pre-trained bias.
+
+    Methods:
+        predict_proba(text): Returns the probability that the query needs a search.
+        fit(texts, labels): Trains the model with SGD on labelled queries.
+        save(path) / load(path): Persists the model to/from a `.npz` file.
+    """
+    def __init__(self, n_features: int = 2 ** 16, weights: np.ndarray = None, bias: float = 0.0):
+        self.n_features = n_features
+        self.weights = weights if weights is not None else np.zeros(n_features, dtype=np.float32)
+        self.bias = float(bias)
+
+    def _featurize(self, text: str):
+        tokens = _tokenize(text)
+        grams = tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+        if not grams:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        hashed = np.fromiter(
+            (zlib.crc32(gram.encode("utf-8")) % self.n_features for gram in grams),
+            dtype=np.int64,
+            count=len(grams)
+        )
+        indices, counts = np.unique(hashed, return_counts=True)
+        values = counts.astype(np.float32) / np.sqrt(len(grams))
+        return indices, values
+
+    def predict_proba(self, text: str) -> float:
+        indices, values = self._featurize(text)
+        logit = float(self.weights[indices] @ values) + self.bias
+        return float(1.0 / (1.0 + np.exp(-logit)))
+
+    def fit(self, texts, labels, epochs: int = 10, learning_rate: float = 0.5, l2: float = 1e-4, seed: int = 0):
+        features = [self._featurize(text) for text in texts]
+        targets = np.asarray(labels, dtype=np.float32)
+        rng = np.random.default_rng(seed)
+
+        for _ in range(epochs):
+            for i in rng.permutation(len(features)):
+                indices, values = features[i]
+                logit = float(self.weights[indices] @ values) + self.bias
+                error = 1.0 / (1.0 + np.exp(-logit)) - targets[i]
+                self.weights[indices] -= learning_rate * (error * values + l2 * self.weights[indices])
+                self.bias -= learning_rate * error
+        logger.info(f"Trained hashed logistic classifier on {len(features)} queries.")
+        return self
+
+    def save(self, path: str):
+        np.savez(path, weights=self.weights, bias=self.bias)
+        logger.info(f"Saved hashed logistic classifier to {path}.")
+
+    @classmethod
+    def load(cls, path: str):
+        data = np.load(path)
+        weights = data["weights"].astype(np.float32)
+        logger.info(f"Loaded hashed logistic classifier from {path}.")
+        return cls(n_features=weights.shape[0], weights=weights, bias=float(data["bias"]))
+
+
+class ToolRouter:
+    """
+    Cheap pre-router that decides "search / no search / ask the LLM" for a query
+    before any tool-bound LLM call is made.
+
+    Keyword/regex rules are checked first. If none match and a classifier is
+    available, its probability is compared against the thresholds. Anything
+    left undecided falls back to the LLM binded with tools.
+
+    Every decision is logged, and optionally appended to a JSONL decision log
+    together with the LLM's own choice on the fallback path. With a shadow rate
+    set, the LLM binded with tools is also called on a sample of turns the
+    router decided by itself, so `evaluate_decision_log()` can measure the
+    router's accuracy against the LLM's own choice.
+
+    Args:
+        classifier (HashedLogisticClassifier): Optional trained classifier.
+        search_threshold (float): Probability at or above which to search.
+        no_search_threshold (float): Probability at or below which to skip search.
+        decision_log_path (str): Optional JSONL file to append decisions to.
+        shadow_rate (float): Share of router-decided turns on which the LLM's own 
+            choice is also logged. Only used with a decision log.
+
+    Methods:
+        decide(query): Returns a (decision, details) tuple.
+        should_shadow(decision): Whether to also ask the LLM for this decision.
+        log_decision(...) / log_llm_choice(...): Record decisions for offline evaluation.
+    """
+    def __init__(
+        self,
+        classifier: HashedLogisticClassifier = None,
+        search_threshold: float = 0.85,
+        no_search_threshold: float = 0.15,
+        decision_log_path: str = None,
+        shadow_rate: float = 0.0
+    ):
+        self.classifier = classifier
+        self.search_threshold = search_threshold
+        self.no_search_threshold = no_search_threshold
+        self.decision_log_path = decision_log_path
+        self.shadow_rate = shadow_rate
+        self._rng = random.Random()
+
+    @classmethod
+    def from_env(cls):
+        """
+        Builds a router from the `TOOL_ROUTER_CLASSIFIER_PATH`, `TOOL_ROUTER_DECISION_LOG`
+        and `TOOL_ROUTER_SHADOW_RATE` environment variables, if set.
+        """
+        classifier_path = os.getenv("TOOL_ROUTER_CLASSIFIER_PATH")
+        classifier = None
+        if classifier_path:
+            try:
+                classifier = HashedLogisticClassifier.load(classifier_path)
+            except Exception as e:
+                logger.exception(f"Failed to load tool router classifier, using rules only: {str(e)}")
+        shadow_rate = 0.0
+        if raw_shadow_rate := os.getenv("TOOL_ROUTER_SHADOW_RATE"):
+            try:
+                shadow_rate = float(raw_shadow_rate)
+            except ValueError:
+                logger.warning(f"Invalid TOOL_ROUTER_SHADOW_RATE {raw_shadow_rate!r}, shadow mode disabled.")
+        return cls(
+            classifier=classifier,
+            decision_log_path=os.getenv("TOOL_ROUTER_DECISION_LOG"),
+            shadow_rate=shadow_rate
+        )
+
+    def decide(self, query: str, use_llm_fallback: bool = True):
+        """
+        Decides whether the query needs a web search.
+
+        Args:
+            query (str): The latest user message.
+            use_llm_fallback (bool): If False, the classifier's best guess is
+                returned instead of `ask_llm` when it is not confident.
+
+        Returns:
+            tuple: (decision, details) where decision is one of `search`,
+            `no_search` or `ask_llm`, and details describes what decided it.
+        """
+        start = time.perf_counter()
+        decision, details = ASK_LLM, {"source": "fallback"}
+
+        no_search_rule = next((name for name, pattern in NO_SEARCH_RULES if pattern.search(query)), None)
+        search_rule = next((name for name, pattern in SEARCH_RULES if pattern.search(query)), None)
+
+        if no_search_rule and search_rule:
+            # e.g. "Summarize the latest news on AI": let the LLM decide
+            details = {"source": "rule_conflict", "rule": f"{no_search_rule}+{search_rule}"}
+        elif no_search_rule:
+            decision, details = NO_SEARCH, {"source": "rule", "rule": no_search_rule}
+        elif search_rule:
+            decision, details = SEARCH, {"source": "rule", "rule": search_rule}
+        elif self.classifier is not None:
+            probability = self.classifier.predict_proba(query)
+            details = {"source": "classifier", "probability": round(probability, 4)}
+            if probability >= self.search_threshold:
+                decision = SEARCH
+            elif probability <= self.no_search_threshold:
+                decision = NO_SEARCH
+            elif not use_llm_fallback:
+                decision = SEARCH if probability >= 0.5 else NO_SEARCH
+
+        # The raw message becomes the search query, so it must stand on its own
+        if decision == SEARCH and use_llm_fallback:
+            if len(query) > MAX_SEARCH_QUERY_CHARS:
+                decision, details = ASK_LLM, {**details, "guard": "too_long"}
+            elif FOLLOW_UP_PATTERN.search(query):
+                decision, details = ASK_LLM, {**details, "guard": "follow_up"}
+
+        details["elapsed_us"] = round((time.perf_counter() - start) * 1e6, 1)
+        return decision, details
+
+    def should_shadow(self, decision: str) -> bool:
+        """
+        Whether the LLM binded with tools should also be called on a turn the
+        router decided by itself, to log its choice for offline evaluation.
+        """
+        if decision == ASK_LLM or not self.decision_log_path or self.shadow_rate <= 0:
+            return False
+        return self._rng.random() < self.shadow_rate
+
+    def _append_record(self, record: dict):
+        if not self.decision_log_path:
+            return
+        try:
+            with open(self.decision_log_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        except OSError as e:
+            logger.warning(f"Failed to write tool router decision log: {str(e)}")
+
+    def log_decision(self, thread_id, query: str, decision: str, details: dict):
+        """
+        Logs a router decision and returns its decision ID, which links it to the
+        LLM's own choice on the fallback path.
+        """
+        decision_id = uuid.uuid4().hex
+        logger.info(f"Tool router decision: {decision} ({details})")
+        self._append_record({
+            "event": "router_decision",
+            "decision_id": decision_id,
+            "timestamp": time.time(),
+            "thread_id": str(thread_id),
+            "query": query,
+            "decision": decision,
+            **details
+        })
+        return decision_id
+
+    def log_llm_choice(self, decision_id: str, thread_id, query: str, searched: bool):
+        """
+        Logs whether the LLM binded with tools chose to search for a query, either 
+        on the `ask_llm` path or as a shadow call on a router-decided turn.
+        """
+        self._append_record({
+            "event": "llm_choice",
+            "decision_id": decision_id,
+            "timestamp": time.time(),
+            "thread_id": str(thread_id),
+            "query": query,
+            "searched": searched
+        })
+
+
+def load_labelled_queries(path: str):
+    """
+    Reads the LLM's own search choices from a decision log or recorded transcript
+    (JSONL records with `query` and `searched` keys).
+
+    Returns:
+        tuple: (queries, labels) lists.
+    """
+    queries, labels = [], []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if "searched" in record and record.get("query"):
+                queries.append(record["query"])
+                labels.append(bool(record["searched"]))
+    return queries, labels
+
+
+def evaluate_router(router: ToolRouter, queries, labels):
+    """
+    Replays labelled queries through a candidate router (e.g. new rules, thresholds
+    or a retrained classifier) and measures how often its decisions agree with the
+    LLM's own choice.
+
+    Queries from the `ask_llm` path of the production router are, by construction,
+    deferred again by that same router; use `evaluate_decision_log()` to measure
+    the production router itself.
+
+    Returns:
+        dict: Coverage (share of queries decided without the LLM), accuracy on
+        the covered queries, and the confusion counts.
+    """
+    return _score_decisions([(router.decide(query)[0], searched) for query, searched in zip(queries, labels)])
+
+
+def _score_decisions(pairs):
+    counts = {"tp": 0, "fp": 0, "tn": 0, "fn": 0, "deferred": 0}
+    for decision, searched in pairs:
+        if decision == ASK_LLM:
+            counts["deferred"] += 1
+        elif decision == SEARCH:
+            counts["tp" if searched else "fp"] += 1
+        else:
+            counts["fn" if searched else "tn"] += 1
+
+    total = len(pairs)
+    covered = total - counts["deferred"]
+    return {
+        "total": total,
+        "coverage": covered / total if total else 0.0,
+        "accuracy": (counts["tp"] + counts["tn"]) / covered if covered else 0.0,
+        **counts
+    }
+
+
+def evaluate_decision_log(path: str):
+    """
+    Joins the router decisions in a decision log with the LLM's own choices
+    (logged on the `ask_llm` path and by shadow calls) and measures how often
+    the router's decisions agreed with the LLM.
+
+    Returns:
+        dict: Coverage, accuracy on router-decided turns and the confusion counts,
+        over all decisions that have a logged LLM choice.
+    """
+    decisions, choices = {}, {}
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if record.get("event") == "router_decision":
+                decisions[record["decision_id"]] = record["decision"]
+            elif record.get("event") == "llm_choice" and record.get("decision_id"):
+                choices[record["decision_id"]] = bool(record["searched"])
+
+    pairs = [(decisions[i], searched) for i, searched in choices.items() if i in decisions]
+    return _score_decisions(pairs)
@@ -1,12 +1,17 @@
 from langchain_ollama import ChatOllama
 from langgraph.checkpoint.memory import MemorySaver
 from langgraph.graph import START, MessagesState, StateGraph
-from langchain_core.messages import BaseMessage
+from langchain_core.messages import AIMessage, BaseMessage, ToolMessage
 from langgraph.graph.message import add_messages
 from langgraph.prebuilt import ToolNode, tools_condition
 from typing_extensions import Annotated, TypedDict
 from typing import Sequence
 from llm_utils import (prompt_template, prompt_template_for_web_search_tool, ddg_search_tool, tavily_search_tool) 
+from tool_router import ToolRouter, SEARCH, NO_SEARCH, ASK_LLM, MAX_SEARCH_QUERY_CHARS
+from search_compression import compress_search_results, record_search_payload, has_search_results
+from shared_store import SearchCache
+import uuid
+import os
 import logging
 
 # Setup logging
@@ -19,6 +24,23 @@ logger = logging.getLogger(__name__)
 
 class State(TypedDict):
     messages: Annotated[Sequence[BaseMessage], add_messages]
+    route_decision: dict
+
+
+def route_after_router(state: State):
+    """
+    Routes the workflow based on the pre-router decision of the current turn.
+
+    - `search`: routes straight to the tools node with the router's tool call.
+    - `no_search`: routes straight to the LLM node.
+    - `ask_llm`: routes to the LLM binded with tools to let it decide.
+    """
+    decision = state.get("route_decision", {}).get("decision", ASK_LLM)
+    if decision == SEARCH:
+        return "tools"
+    if decision == NO_SEARCH:
+        return "llm"
+    return "llm_with_tools"
 
 
 def route_tools(
@@ -64,50 +86,150 @@ class LLMWorkflow:
         trimmer:
             An initialized trimmer used to trim older message during graph execution.
 
+        tool_router (ToolRouter):
+            Optional pre-router deciding whether a turn needs web search before the 
+            LLM binded with tools is called. Defaults to `ToolRouter.from_env()`.
+
+        search_token_budget (int):
+            Approximate token budget for compressed web search results fed to the LLM.
+
+        checkpointer:
+            Optional LangGraph checkpointer, e.g. a `SqliteSaver` shared by several worker 
+            processes. Defaults to an in-memory `MemorySaver`.
+
+        search_cache (SearchCache):
+            Optional web search cache shared by several worker processes.
+
     Attributes:
         llm (ChatOllama): The LLM used in the workflow.
         llm_with_tools: LLM binded with tools
         workflow: The compiled LangGraph workflow with memory checkpointing.
         trimmer: The message trimmer used in the workflow. 
+        tool_router: The pre-router used in the workflow.
+        search_token_budget: Token budget for compressed web search results.
+        search_payload_log: Optional JSONL file (`SEARCH_PAYLOAD_LOG`) recording raw search payloads.
+        checkpointer: The checkpointer the workflow is compiled with.
+        search_cache: Shared web search cache, if any.
 
     Methods:
         get_workflow(): 
             Returns the compiled LangGraph workflow, ready for execution.
     """
-    def __init__(self, llm: ChatOllama, trimmer):
+    def __init__(
+        self,
+        llm: ChatOllama,
+        trimmer,
+        tool_router: ToolRouter = None,
+        search_token_budget: int = 1200,
+        checkpointer=None,
+        search_cache: SearchCache = None
+    ):
         self.llm = llm
         self.llm_with_tools = self._build_llm_with_tools()
         self.trimmer = trimmer
+        self.tool_router = tool_router or ToolRouter.from_env()
+        self.search_token_budget = search_token_budget
+        self.search_payload_log = os.getenv("SEARCH_PAYLOAD_LOG")
+        self.checkpointer = checkpointer or MemorySaver()
+        self.search_cache = search_cache
         self.workflow = self._build_workflow()
 
     def _build_llm_with_tools(self):
         llm_with_tools = self.llm.bind_tools([tavily_search_tool])
         return llm_with_tools
 
-    def _call_llm_with_tools(self, state: State):
+    def _route(self, state: State, config: dict):
+        """
+        Node function that runs the cheap pre-router on the latest user message.
+
+        If web search is disabled via the config, the router is skipped and the 
+        turn goes straight to the LLM node. If the router decides to search, 
+        a tool call for the user message is created without invoking the LLM. 
+        On a sample of router-decided turns (shadow mode), the LLM binded with tools 
+        is also called and its choice logged, without affecting the route.
+
+        Args:
+            state (State): The current state including messages.
+            config (dict): The runnable config including `use_web_search`.
+
+        Returns:
+            dict: The route decision, plus the tool call message when searching.
+        """
+        configurable = config.get("configurable", {})
+        if not configurable.get("use_web_search", False):
+            return {"route_decision": {"decision": NO_SEARCH, "source": "disabled"}}
+
+        query = state["messages"][-1].content
+        decision, details = self.tool_router.decide(query)
+        decision_id = self.tool_router.log_decision(
+            configurable.get("thread_id"), query, decision, details
+        )
+        update = {"route_decision": {"decision": decision, "decision_id": decision_id, **details}}
+
+        if self.tool_router.should_shadow(decision):
+            try:
+                logger.info("Shadow-invoking model with tools for router evaluation...")
+                response = self._invoke_llm_with_tools(state["messages"])
+                self.tool_router.log_llm_choice(
+                    decision_id, configurable.get("thread_id"), query, len(response.tool_calls) > 0
+                )
+            except Exception as e:
+                logger.warning(f"Shadow model invocation failed, ignoring: {str(e)}")
+
+        if decision == SEARCH:
+            update["messages"] = [AIMessage(
+                content="",
+                tool_calls=[{
+                    "name": tavily_search_tool.name,
+                    "args": {"query": query[:MAX_SEARCH_QUERY_CHARS]},
+                    "id": f"call_{uuid.uuid4().hex}",
+                    "type": "tool_call"
+                }]
+            )]
+        return update
+
+    def _invoke_llm_with_tools(self, messages):
+        """
+        Invokes the LLM binded with tools on the trimmed messages with the default prompt.
+
+        Args:
+            messages (list): The messages from the state.
+
+        Returns:
+            AIMessage: The model's response, possibly with tool calls.
+        """
+        logger.info("Trimming messages....")
+        trimmed_messages = self.trimmer.invoke(messages)
+
+        logger.info("Generating prompt from trimmed messages...")
+        prompt = prompt_template.invoke(
+            {"messages": trimmed_messages}
+        )
+
+        logger.info("Invoking model with tools...")
+        return self.llm_with_tools.invoke(prompt)
+
+    def _call_llm_with_tools(self, state: State, config: dict):
         """
         Node function that invokes the LLM binded with tools on the trimmed messages from the state with a prompt 
-        and returns the tool calling argument.
+        and returns the tool calling argument. The LLM's choice is logged by the tool router for offline evaluation.
 
         Args:
             state (State): The current state including messages.
+            config (dict): The runnable config including `thread_id`.
 
         Returns:
             dict: A dictionary with the model's response message wrapped in a list.
         """
         try:
-            logger.info("Trimming messages....")
-            trimmed_messages = self.trimmer.invoke(state["messages"])
-            # logger.info(f"Trimmed message: {trimmed_messages}")
-
-            logger.info("Generating prompt from trimmed messages...")
-            prompt = prompt_template.invoke(
-                {"messages": trimmed_messages}
+            response = self._invoke_llm_with_tools(state["messages"])
+            searched = hasattr(response, "tool_calls") and len(response.tool_calls) > 0
+            self.tool_router.log_llm_choice(
+                state.get("route_decision", {}).get("decision_id"),
+                config.get("configurable", {}).get("thread_id"),
+                state["messages"][-1].content,
+                searched
             )
-            # logger.info(f"Prompt for model with tools: {prompt}")
-            
-            logger.info("Invoking model with tools...")
-            response = self.llm_with_tools.invoke(prompt)
             if hasattr(response, "tool_calls") and len(response.tool_calls) <= 0:
                 logger.info("No tool calls from model response.")
                 return None
@@ -118,6 +240,106 @@ class LLMWorkflow:
             logger.exception(f"Failed during model invocation in _call_model: {str(e)}")
             raise  # Re-raise to let LangGraph handle or fail explicitly
         
+    def _call_tools_with_cache(self, state: State):
+        """
+        Node function that runs the web search tool calls of the last AI message, 
+        serving repeated queries from the shared search cache.
+
+        Args:
+            state (State): The current state including messages.
+
+        Returns:
+            dict: A dictionary with one tool message per tool call.
+        """
+        tool_messages = []
+        for tool_call in state["messages"][-1].tool_calls:
+            if tool_call["name"] != tavily_search_tool.name:
+                logger.warning(f"Unknown tool requested: {tool_call['name']}")
+                tool_messages.append(ToolMessage(
+                    content=f"Error: {tool_call['name']} is not a valid tool, try one of [{tavily_search_tool.name}].",
+                    tool_call_id=tool_call["id"],
+                    name=tool_call["name"],
+                    status="error"
+                ))
+                continue
+
+            query = tool_call["args"].get("query", "")
+            content = self.search_cache.get(query)
+            if content is not None:
+                logger.info(f"Search cache hit for query: {query}")
+                tool_messages.append(ToolMessage(
+                    content=content,
+                    tool_call_id=tool_call["id"],
+                    name=tool_call["name"]
+                ))
+                continue
+
+            logger.info(f"Search cache miss, invoking {tool_call['name']} for query: {query}")
+            try:
+                tool_message = tavily_search_tool.invoke(tool_call)
+            except Exception as e:
+                logger.exception(f"Failed during tool invocation in _call_tools_with_cache: {str(e)}")
+                tool_message = ToolMessage(
+                    content=f"Error: {repr(e)}\n Please fix your mistakes.",
+                    tool_call_id=tool_call["id"],
+                    name=tool_call["name"],
+                    status="error"
+                )
+            if tool_message.status != "error" and has_search_results(tool_message.content):
+                self.search_cache.set(query, tool_message.content)
+            tool_messages.append(tool_message)
+        return {"messages": tool_messages}
+
+    def _compress_search_results(self, state: State):
+        """
+        Node function that compresses the tool messages of the current turn 
+        before they are fed to the LLM, keeping the most query-relevant sentences 
+        within the token budget along with each result's title and URL.
+
+        Args:
+            state (State): The current state including messages.
+
+        Returns:
+            dict: The compressed tool messages, replacing the originals by ID.
+        """
+        messages = state["messages"]
+        tool_messages = []
+        for message in reversed(messages):
+            if message.type != "tool":
+                break
+            tool_messages.append(message)
+        if not tool_messages:
+            return None
+
+        ai_message = messages[-len(tool_messages) - 1]
+        queries = {
+            tool_call["id"]: tool_call["args"].get("query", "")
+            for tool_call in getattr(ai_message, "tool_calls", [])
+        }
+
+        compressed_messages = []
+        for message in reversed(tool_messages):
+            query = queries.get(message.tool_call_id, "")
+            if self.search_payload_log:
+                record_search_payload(self.search_payload_log, query, message.content)
+            try:
+                content = compress_search_results(message.content, query, self.search_token_budget)
+            except Exception as e:
+                logger.exception(f"Failed to compress search results, using raw output: {str(e)}")
+                continue
+            if content == message.content:
+                continue
+            logger.info(f"Compressed search results from {len(message.content)} to {len(content)} characters.")
+            compressed_messages.append(ToolMessage(
+                content=content,
+                tool_call_id=message.tool_call_id,
+                name=message.name,
+                id=message.id,
+                status=message.status,
+                artifact=message.artifact
+            ))
+        return {"messages": compressed_messages}
+
     def _call_llm(self, state: State):
         """
         Node function that invokes the LLM on the trimmed messages from the state with a prompt 
@@ -161,29 +383,39 @@ class LLMWorkflow:
     
     def _build_workflow(self):
         """
-        Builds and compiles the LangGraph workflow with a single model node 
-        and a memory checkpointer.
+        Builds and compiles the LangGraph workflow with a pre-router entry node, 
+        model nodes, a tools node with search result compression and a checkpointer. 
+        The checkpointer is in memory unless a shared one is passed in.
 
         Returns:
             workflow: A compiled LangGraph workflow object.
         """
         logger.info("Building LangGraph workflow...")
         graph = StateGraph(state_schema=State)
-        tool_node = ToolNode(tools=[tavily_search_tool])
+        if self.search_cache is not None:
+            tool_node = self._call_tools_with_cache
+        else:
+            tool_node = ToolNode(tools=[tavily_search_tool])
 
+        graph.add_node("router", self._route)
         graph.add_node("llm", self._call_llm)
         graph.add_node("llm_with_tools", self._call_llm_with_tools)
         graph.add_node("tools", tool_node)
+        graph.add_node("compress_search_results", self._compress_search_results)
 
+        graph.add_conditional_edges(
+            "router",
+            route_after_router
+        )
         graph.add_conditional_edges(
             "llm_with_tools",
             route_tools
         )
-        graph.add_edge("tools", "llm")
-        graph.set_entry_point("llm_with_tools")
+        graph.add_edge("tools", "compress_search_results")
+        graph.add_edge("compress_search_results", "llm")
+        graph.set_entry_point("router")
         
-        memory = MemorySaver()
-        workflow = graph.compile(checkpointer=memory)
+        workflow = graph.compile(checkpointer=self.checkpointer)
         logger.info("Workflow compiled successfully.")
         
         return workflow